@@ -1,14 +1,16 @@
 from argparse import ArgumentParser
 import csv
+import os
 from pathlib import Path
-from html import escape
+from urllib.parse import quote
+
+from create_tabby_filelist import quote_tsv_field
 
 # Source: https://github.com/abcd-j/data-catalog/issues/22
 # Currently a custom script for the gliem_pavic dataset
 # How can we generalise this?
 
 url_root = 'https://www.ncbi.nlm.nih.gov/geo/download/'
-fieldnames = ['path[POSIX]', 'size[bytes]', 'checksum[md5]', 'url']
 
 if __name__ == "__main__":
     # Argument parsing and validation
@@ -21,21 +23,32 @@ if __name__ == "__main__":
     )    
     args = parser.parse_args()    
 
-    with open(Path(args.file_path), encoding='utf8', newline='') as file:
-        reader = csv.DictReader(file, delimiter='\t')
-        out_rows = []
-        for row in reader:
-            filename = Path(row['path[POSIX]']).name
-            fparts = filename.split('_')
-            file_id = fparts[0]
-            row['url'] = f"{url_root}?acc={file_id}&format=file&file={escape(filename)}"
-            out_rows.append(row)    
-    
-    with open(Path(args.out_path), 'w', encoding='utf8', newline='') as output_file:
-            fc = csv.DictWriter(
-                output_file,
-                fieldnames=fieldnames,
-                delimiter='\t'
-            )
-            fc.writerow(dict((fn,fn) for fn in fieldnames))
-            fc.writerows(out_rows)
\ No newline at end of file
+    # Stream rows from input to output, so that memory use does not
+    # grow with the length of the file list. Rows are formatted directly
+    # instead of going through csv.DictWriter, quoting values only where needed
+    # and ending lines in '\r\n' like csv.DictWriter does.
+    # The output goes to a temporary file next to out_path that replaces it
+    # at the end, so that out_path may also be the input file.
+    out_path = Path(args.out_path)
+    tmp_path = out_path.with_name(f'.{out_path.name}.tmp')
+    try:
+        with open(Path(args.file_path), encoding='utf8', newline='') as file, \
+                open(tmp_path, 'w', encoding='utf8', newline='', buffering=1<<20) as output_file:
+            reader = csv.DictReader(file, delimiter='\t')
+            # keep the input columns, e.g. the checksum column (which is named
+            # after the hash algorithm), and make sure there is a url column
+            fieldnames = list(reader.fieldnames)
+            if 'url' not in fieldnames:
+                fieldnames.append('url')
+            output_file.write('\t'.join([quote_tsv_field(fn) for fn in fieldnames]) + '\r\n')
+            for row in reader:
+                # POSIX path, so the name is everything after the last slash
+                filename = row['path[POSIX]'].rsplit('/', 1)[-1]
+                fparts = filename.split('_')
+                file_id = fparts[0]
+                row['url'] = f"{url_root}?acc={file_id}&format=file&file={quote(filename, safe='')}"
+                output_file.write('\t'.join([quote_tsv_field(row[fn]) for fn in fieldnames]) + '\r\n')
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, out_path)
@@ -6,23 +6,63 @@ File information is compliant with the tabby convention for a collection-of-file
 (see: https://docs.datalad.org/projects/tabby/en/latest/conventions/tby-ds1.html)
 and includes:
     - the file path (column: path[POSIX])
-    - the file content checksum, using the md5 hash algorithm (column: checksum[md5])
+    - the file content checksum, using the sha256 hash algorithm by default
+      (column: checksum[sha256]); other hashlib algorithms and blake3
+      are also available
     - the file size in bytes (column: size[bytes])
     - the empty file url (column: url)
 
 The output table can be printed to STDOUT or to a text file in TSV format.
 """
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import os
 from pathlib import Path
 import argparse
 import hashlib
-import csv
+import importlib.util
+import mmap
+import re
+import warnings
+
+
+# Buffer size handed to hashlib.file_digest, so that each hash update
+# processes a large chunk of the file in C
+HASH_BUFSIZE = 4 * 1024 * 1024
+
+# Hash algorithms accepted on the command line: any fixed-length
+# algorithm available through hashlib, plus blake3. sha256 is the default
+# since OpenSSL dispatches it to the SHA extensions of modern CPUs, where
+# it outperforms md5; blake2b is fast on CPUs without such extensions.
+# blake3 requires the optional 'blake3' package, which hashes large
+# files using SIMD instructions and multiple threads.
+HASH_ALGORITHMS = tuple(sorted(
+    {a for a in hashlib.algorithms_available if not a.startswith('shake_')}
+    | {'blake3'}
+))
+
+# Files larger than this (in bytes) are hashed from a memory map
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+# git-annex key of the MD5E or MD5 backend, giving size and md5 checksum
+ANNEX_MD5_KEY = re.compile(r'MD5E?-s(\d+)--([0-9a-f]{32})')
+
+# Characters that require a TSV field to be quoted
+_TSV_SPECIAL = re.compile(r'[\t\n\r"]')
+
+# Per-file record; a tuple is much smaller than a dict when listing
+# millions of files
+FileInfo = namedtuple('FileInfo', 'path size hash url')
+
+# Number of threads used for hashing files concurrently
+HASH_WORKERS = min(32, (os.cpu_count() or 1) * 2)
 
 
 def create_filetable(
     rootpath: str,
     method: str = 'tree',
-    hash: str = 'md5',
+    hash: str = None,
     recursive: bool = True,
     output: str = 'stdout',
 ):
@@ -35,9 +75,11 @@ def create_filetable(
             should be printed.
         
         hash (str, optional): Name of the algorithm to be used for
-            calculating file hashes, e.g. 'md5' or 'sha256'. The
-            algorithm must be supported by the Python 'hashlib' module.
-            Defaults to 'md5'.
+            calculating file hashes, e.g. 'sha256', 'md5' or 'blake2b'.
+            The algorithm must be supported by the Python 'hashlib' module,
+            or be 'blake3' (requires the 'blake3' package).
+            Defaults to 'sha256', or to 'md5' with method 'tree', which
+            only supports md5.
         
         recursive (bool, optional): Set this flag to recurse into
             subdirectories. Defaults to False.
@@ -45,81 +87,211 @@ def create_filetable(
         output (str, optional): A directory of filename to save the
             output to. Defaults to 'stdout.
     """
-    # Get file list
-    out_info = []
-
+    outpath = None if output == 'stdout' else _get_output_path(output)
+    # The file list is produced while the output file is being written,
+    # so the output file itself is left out of it
+    exclude = None if outpath is None else outpath.resolve()
+    # Get file list, as a generator of FileInfo records that are
+    # written out as soon as they are available
     if method == 'tree':
-        _tree2filelist(Path(rootpath).resolve(), out_info)
+        # checksums are read from md5-based annex keys or computed with md5
+        if hash not in (None, 'md5'):
+            warnings.warn(
+                f"method 'tree' only supports md5 checksums, ignoring hash={hash!r}")
+        hash = 'md5'
+        out_info = _tree2filelist(Path(rootpath).resolve(), exclude=exclude)
     else:
-        _dir2filelist(Path(rootpath), Path(rootpath), out_info, hash, recursive)
+        if hash is None:
+            hash = 'sha256'
+        if hash == 'blake3':
+            # fail before any output is written if the package is missing
+            if importlib.util.find_spec('blake3') is None:
+                raise ImportError(
+                    "hash algorithm 'blake3' requires the 'blake3' package")
+            hashclass = None
+            # blake3 already hashes each file with multiple threads
+            max_workers = 1
+        else:
+            # resolve the hash constructor once rather than per file;
+            # some OpenSSL algorithms (e.g. ripemd160) only have hashlib.new
+            hashclass = getattr(hashlib, hash, None) or partial(hashlib.new, hash)
+            max_workers = HASH_WORKERS
+        out_info = _dir2filelist(Path(rootpath), Path(rootpath), hash, recursive,
+                                 hashclass=hashclass, max_workers=max_workers,
+                                 exclude=exclude)
     # Output the data
     # header compliant with tby-ds1 convention
-    header = {
-        'path': 'path[POSIX]',
-        'size': 'size[bytes]',
-        'hash': f'checksum[{hash}]',
-        'url': 'url'
-    }
-    fieldnames = out_info[0].keys()
-    headernames = [header[fn] for fn in fieldnames]
-    if output != 'stdout':
-        outpath = _get_output_path(output)
-        with open(outpath, 'w', encoding='utf8', newline='') as output_file:
-            fc = csv.DictWriter(
-                output_file,
-                fieldnames=fieldnames,
-                delimiter='\t'
-            )
-            fc.writerow(dict((fn,hn) for (fn,hn) in zip(fieldnames, headernames)))
-            fc.writerows(out_info)
+    headernames = ('path[POSIX]', 'size[bytes]', f'checksum[{hash}]', 'url')
+    if outpath is not None:
+        # Rows are formatted directly instead of going through
+        # csv.DictWriter; only paths can contain characters that need
+        # quoting (sizes, hex digests, and the empty url never do).
+        # Lines end in '\r\n', the csv module's default line terminator
+        with open(outpath, 'w', encoding='utf8', newline='', buffering=1<<20) as output_file:
+            output_file.write('\t'.join(headernames) + '\r\n')
+            for r in out_info:
+                output_file.write(f"{quote_tsv_field(str(r.path))}\t{r.size}\t{r.hash}\t{r.url}\r\n")
         print(f'Output saved to: {outpath.absolute()}')
     else:
-        print(f'{header["hash"]}\t{header["size"]}\t{header["path"]}\t{header["url"]}')
+        print(f'{headernames[2]}\t{headernames[1]}\t{headernames[0]}\t{headernames[3]}')
         for el in out_info:
-            print(f'{el["hash"]}\t{el["size"]}\t{el["path"]}\t')
+            print(f'{el.hash}\t{el.size}\t{el.path}\t')
+
+
+def quote_tsv_field(value: str):
+    """
+    Returns value quoted like csv.writer (with a tab delimiter) would,
+    i.e. in double quotes with inner double quotes doubled, if it
+    contains a tab, a line break or a double quote; else unchanged.
+    None (e.g. a missing trailing cell from csv.DictReader) gives an
+    empty field, as with csv.writer
+    """
+    if value is None:
+        return ''
+    if _TSV_SPECIAL.search(value):
+        return '"' + value.replace('"', '""') + '"'
+    return value
 
 
 def _dir2filelist(
     rootpath: Path,
     relpath: Path,
-    result: list,
     hash: str = 'md5',
     recursive: bool = True,
+    hashclass=None,
+    max_workers: int = HASH_WORKERS,
+    exclude: Path = None,
 ):
-    """"""
+    """
+    Yield a FileInfo for each file below relpath, in walk order,
+    leaving out the file at the resolved path exclude.
+
+    Files are hashed concurrently while the walk proceeds; at most a few
+    files per worker are in flight, so records are produced from the
+    start and memory use does not grow with the number of files.
+    hashlib.file_digest releases the GIL while hashing and reading, so
+    threads overlap file I/O and hashing of several files.
+    """
     if relpath is None:
         relpath=rootpath
-    for f in relpath.glob('*'):
-        if f.is_file():
-            f_info = get_file_info(rp=rootpath,
-                                   fp=f,
-                                   hash_algo=hash)
-            result.append(f_info)                
-        elif f.is_dir():
-            if recursive:
-                _dir2filelist(rootpath, f, result, hash, recursive)
-        else:
-            # what to do here?
-            pass
-    return
+    max_pending = 2 * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for fp, st in _walk_files(relpath, recursive, exclude):
+            pending.append(
+                executor.submit(get_file_info, rp=rootpath, fp=fp, hash_algo=hash,
+                                st=st, hashclass=hashclass)
+            )
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 
+def _walk_files(relpath: Path, recursive: bool = True, exclude: Path = None):
+    """
+    Yield (path, stat result) for each file below relpath, except for
+    the file at the resolved path exclude.
 
-def get_file_info(rp: Path, fp: Path, hash_algo: str = 'md5'):
+    Directories are walked iteratively (depth-first, entries sorted by
+    name for a deterministic order) with os.scandir, whose DirEntry
+    objects carry the file type from the directory listing and thus
+    mostly avoid an extra stat() call per entry.
     """
-    Returns a dict with path, checksum, and size in bytes
+    stack = [relpath]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        subdirs = []
+        for entry in entries:
+            # follow symlinks for files, e.g. annexed content
+            if entry.is_file():
+                if _is_excluded(entry.path, exclude):
+                    continue
+                yield Path(entry.path), entry.stat()
+            elif entry.is_dir(follow_symlinks=False) and recursive:
+                subdirs.append(entry.path)
+        # visit subdirectories in name order
+        stack.extend(reversed(subdirs))
+
+
+def _is_excluded(path: str, exclude: Path = None):
+    """
+    Returns whether path resolves to exclude; paths are only resolved
+    if their file name matches, to keep the check cheap
+    """
+    return (
+        exclude is not None
+        and os.path.basename(path) == exclude.name
+        and Path(path).resolve() == exclude
+    )
+
+
+def get_file_info(
+    rp: Path,
+    fp: Path,
+    hash_algo: str = 'md5',
+    st: os.stat_result = None,
+    hashclass=None,
+):
+    """
+    Returns a FileInfo with path, checksum, and size in bytes
     of a Path object (path is relative to a root Path)
+
+    A stat result already obtained by the caller (e.g. from a directory
+    walk) can be passed as st to avoid stat-ing the file again, and
+    the hashlib constructor for hash_algo as hashclass to avoid looking
+    it up for every file.
     """
-    with open(fp, "rb") as f:
-        hashclass = getattr(hashlib, hash_algo)
-        h = hashlib.file_digest(f, hashclass)
-    stats = os.stat(str(fp))
-    return dict(path=fp.relative_to(rp),
-                size=stats.st_size,
-                hash=h.hexdigest(),
-                url='',
+    if st is None:
+        st = os.stat(fp)
+    if hash_algo == 'blake3':
+        h = _blake3_file_digest(fp)
+    else:
+        if hashclass is None:
+            hashclass = getattr(hashlib, hash_algo)
+        if st.st_size > MMAP_THRESHOLD:
+            h = _mmap_file_digest(fp, hashclass)
+        else:
+            # unbuffered binary file: file_digest manages its own buffer
+            with open(fp, "rb", buffering=0) as f:
+                h = hashlib.file_digest(f, hashclass, _bufsize=HASH_BUFSIZE)
+    return FileInfo(path=fp.relative_to(rp),
+                    size=st.st_size,
+                    hash=h.hexdigest(),
+                    url='',
     )
 
 
+def _mmap_file_digest(fp: Path, hashclass):
+    """
+    Returns a hash object for the content of a file, hashed directly
+    from a memory map of the file without copying it into a buffer
+    """
+    with open(fp, "rb") as f:
+        fd = f.fileno()
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+            h = hashclass()
+            h.update(mm)
+        if hasattr(os, 'posix_fadvise'):
+            # content is read only once, don't keep it in the page cache
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return h
+
+
+def _blake3_file_digest(fp: Path):
+    """
+    Returns a blake3 hash object for the content of a file, hashed from
+    a memory map of the file with multiple threads
+    """
+    import blake3
+    h = blake3.blake3(max_threads=blake3.blake3.AUTO)
+    h.update_mmap(fp)
+    return h
+
+
 def _get_output_path(out_str):
     """
     Creates Path object from the provided output string with a filename
@@ -148,7 +320,7 @@ def _get_output_path(out_str):
 
 def _tree2filelist(
     rootpath: Path,
-    result: list,
+    exclude: Path = None,
 ):
     from datalad.api import tree
     res = tree(
@@ -157,9 +329,11 @@ def _tree2filelist(
         return_type='generator'
     )
     for r in res:
+        if r.get('type') == 'file' and _is_excluded(r['path'], exclude):
+            continue
         fileinfo = _get_treenode_info(rootpath=rootpath, node=r)
         if fileinfo:
-            result.append(fileinfo)
+            yield fileinfo
 
 
 def _get_treenode_info(rootpath: Path, node: dict):
@@ -167,22 +341,34 @@ def _get_treenode_info(rootpath: Path, node: dict):
     # Only handle type = file
     if tp == 'file':
         fp = Path(node['path'])
+        # annexed files carry an md5-based annex key, either reported
+        # directly (e.g. unlocked files) or as the name of the symlink
+        # target; if so, take size and checksum from it without hashing
+        annexkey = node.get('annexkey')
         symlink_target = node.get('symlink_target')
-        # if file is a symlink, get 
-        if symlink_target:
-            return _get_info_from_symlink_target(rp=rootpath, fp=fp, target=symlink_target)
-        else:
-            return get_file_info(rp=rootpath, fp=fp, hash_algo='md5')
+        if not annexkey and symlink_target:
+            annexkey = Path(symlink_target).name
+        if annexkey:
+            info = _get_info_from_annex_key(rp=rootpath, fp=fp, key=annexkey)
+            if info:
+                return info
+        return get_file_info(rp=rootpath, fp=fp, hash_algo='md5')
     else:
         return None
 
 
-def _get_info_from_symlink_target(rp: Path, fp: Path, target: str):
-    stemparts = Path(target).stem.split('--')
-    return dict(
+def _get_info_from_annex_key(rp: Path, fp: Path, key: str):
+    """
+    Returns a FileInfo with path, checksum, and size in bytes parsed from
+    an MD5E (or MD5) git-annex key, or None for other key backends
+    """
+    match = ANNEX_MD5_KEY.match(key)
+    if match is None:
+        return None
+    return FileInfo(
         path=fp.relative_to(rp),
-        size=int(stemparts[0].replace('MD5E-s', '')),
-        hash=stemparts[1],
+        size=int(match.group(1)),
+        hash=match.group(2),
         url='',
     )
 
@@ -203,10 +389,10 @@ if __name__ == '__main__':
         "methods to be added (ls-file-collection, others?). Default = 'glob'"
     )
     p.add_argument(
-        '--hash', metavar='HASH', default='md5',
+        '--hash', metavar='HASH', default=None, choices=HASH_ALGORITHMS,
         help="Name of the algorithm to be used for calculating file hashes, "
-        "e.g. 'md5' or 'sha256'. The algorithm must be supported by the Python "
-        "'hashlib' module. Default = 'md5'"
+        f"one of {HASH_ALGORITHMS}. 'blake3' requires the 'blake3' package. "
+        "Method 'tree' only supports 'md5'. Default = 'sha256' ('md5' for 'tree')"
     )
     p.add_argument(
         '--non-recursive', action='store_true',
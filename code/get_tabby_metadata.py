@@ -2,6 +2,7 @@
 Get tabby metadata from a datalad dataset
 """
 from argparse import ArgumentParser
+from functools import lru_cache
 import json
 from pathlib import Path
 from pyld import jsonld
@@ -19,7 +20,7 @@ from utils import (
     process_arc,
     process_authors,
     process_data_controller,
-    process_file,
+    process_files,
     process_funding,
     process_homepage,
     process_keywords,
@@ -35,15 +36,57 @@ from queries import (
     repr_uberon,
 )
 
+
+# Map "id_source" to a function returning (dataset_id, dataset_version)
+# from the compacted tabby record and the datalad dataset (if any)
+_ID_SOURCES = {
+    # mint uuid from the 'name' field
+    "tabby_mint": lambda c, ds: (mint_dataset_id(c.get("name")), c.get("version", "latest")),
+    # get id directly from the 'name' field
+    "tabby_direct": lambda c, ds: (c.get("name"), c.get("version", "latest")),
+    # grab id from the associated datalad dataset
+    "datalad_dataset": lambda c, ds: (ds.id, ds.repo.get_hexsha()),
+}
+
+
 def get_tabby_metadata(tabby_path, dataset_path=None, id_source='tabby_mint', convention='tby-r2d2v0'):
-    # Provide EITHER tabby_path OR dataset_path
+    """Get catalog records from tabby metadata
+
+    Provide EITHER tabby_path OR dataset_path. Results are cached per
+    tabby file (and its modification time), dataset path, id source,
+    and convention, so repeated calls for the same unchanged record
+    skip the JSON-LD processing. The returned records are shared
+    between calls and should not be modified. The modification time
+    only covers the dataset sheet, so call get_tabby_metadata.cache_clear()
+    after other tabby sheets or the dataset itself have changed.
+
+    """
+    # Determine the tabby file here, so that the cache key and the
+    # loaded file are the same
+    if dataset_path is not None:
+        dataset_path = Path(dataset_path).resolve()
+        tabby_path = dataset_path / f'.datalad/tabby/self/dataset@{convention}.tsv'
+    else:
+        tabby_path = Path(tabby_path).resolve()
+    mtime_ns = tabby_path.stat().st_mtime_ns if tabby_path.exists() else None
+    return list(_get_tabby_metadata(
+        tabby_path,
+        mtime_ns,
+        dataset_path,
+        id_source,
+    ))
 
+
+# Only a few records (e.g. the home page record) are requested repeatedly,
+# so keep a small number of results, each including a full file listing
+@lru_cache(maxsize=4)
+def _get_tabby_metadata(tabby_path, mtime_ns, dataset_path, id_source):
+    """Cached worker of get_tabby_metadata; mtime_ns is only used as cache key"""
     # Some validation
     if dataset_path is not None:
         dataset = EnsureDataset(
             installed=True, purpose="extract tabby metadata", require_id=True
         )(dataset_path).ds
-        tabby_path = dataset.pathobj / f'.datalad/tabby/self/dataset@{convention}.tsv'
         print(tabby_path)
         assert tabby_path.exists()
         if id_source != "datalad_dataset":
@@ -52,7 +95,6 @@ def get_tabby_metadata(tabby_path, dataset_path=None, id_source='tabby_mint', co
             id_source = "datalad_dataset"
     else:
         dataset = None
-        tabby_path = Path(tabby_path)
         assert tabby_path.exists()
 
     # Load tabby record
@@ -66,23 +108,11 @@ def get_tabby_metadata(tabby_path, dataset_path=None, id_source='tabby_mint', co
     )
 
     # Json-ld stuff
-    expanded = jsonld.expand(meta_record)
     compacted = jsonld.compact(meta_record, ctx=CAT_CONTEXT)
 
     # Determine dataset id and version from "id_source"
-    if id_source == "tabby_mint":
-        # mint uuid from the 'name' field
-        dataset_id = mint_dataset_id(compacted.get("name"))
-        dataset_version = compacted.get("version", "latest")
-    if id_source == "tabby_direct":
-        # get id directly from the 'name' field
-        dataset_id = compacted.get("name")
-        dataset_version = compacted.get("version", "latest")
-    if id_source == "datalad_dataset":
-        # grab id from the associated datalad dataset
-        dataset_id = dataset.id
-        dataset_version = dataset.repo.get_hexsha()
-    
+    dataset_id, dataset_version = _ID_SOURCES[id_source](compacted, dataset)
+
     # Use catalog schema_utils to get base structure of metadata item
     meta_item = get_metadata_item(
         item_type='dataset',
@@ -152,18 +182,19 @@ def get_tabby_metadata(tabby_path, dataset_path=None, id_source='tabby_mint', co
         exclude_keys=["path"],
     )
     # make a list of catalog-conforming dicts
-    cat_file_listing = []
     all_files = compacted.get('fileList', [])
     if not isinstance(all_files, list):
         all_files = [all_files]
-    
-    for file_info in all_files:
-        cat_file = file_required_meta | process_file(file_info)
-        cat_file_listing.append(cat_file)
+    cat_file_listing = [
+        file_required_meta | cat_file for cat_file in process_files(all_files)
+    ]
     
     return [meta_item] + cat_file_listing
 
 
+get_tabby_metadata.cache_clear = _get_tabby_metadata.cache_clear
+
+
 if __name__ == "__main__":
 
     parser = ArgumentParser()
@@ -1,13 +1,30 @@
 from argparse import ArgumentParser
-import json
 from pathlib import Path
 
+from datalad.api import (
+    catalog_add,
+    catalog_set,
+)
 from datalad_catalog.extractors import catalog_core
 from datalad_next.constraints.dataset import EnsureDataset
 
 from get_tabby_metadata import get_tabby_metadata
 
 
+try:
+    # orjson is considerably faster, but optional
+    import orjson
+
+    def json_dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    from json import dumps as json_dumps
+
+
+REPO_PATH = Path(__file__).resolve().parent.parent
+CATALOG_DIR = REPO_PATH / 'catalog'
+SUPERDS_CONFIG = REPO_PATH / 'inputs' / 'superds-config.json'
+
 
 def get_super_metadata(dataset):
     """"""
@@ -24,28 +41,22 @@ def get_super_metadata(dataset):
 
 
 def add_super_to_catalog(core_record, tabby_records, ds):
-    repo_path = Path(__file__).resolve().parent.parent
-    from datalad.api import  (
-        catalog_add,
-        catalog_set,
-    )
-    catalog_dir = repo_path / 'catalog'
     # Add core metadata to the catalog
     catalog_add(
-        catalog=catalog_dir,
-        metadata=json.dumps(core_record),
-        config_file = repo_path / 'inputs' / 'superds-config.json',
+        catalog=CATALOG_DIR,
+        metadata=json_dumps(core_record),
+        config_file = SUPERDS_CONFIG,
     )
     # Add tabby metadata to the catalog
     for r in tabby_records:
         catalog_add(
-            catalog=catalog_dir,
-            metadata=json.dumps(r),
-            config_file = repo_path / 'inputs' / 'superds-config.json',
+            catalog=CATALOG_DIR,
+            metadata=json_dumps(r),
+            config_file = SUPERDS_CONFIG,
         )
     # Set the catalog home page
     catalog_set(
-        catalog=catalog_dir,
+        catalog=CATALOG_DIR,
         property="home",
         dataset_id=ds.id,
         dataset_version=ds.repo.get_hexsha(),
@@ -69,9 +80,9 @@ if __name__ == "__main__":
 
     core_record, tabby_records = get_super_metadata(ds)
     
-    print(json.dumps(core_record))
+    print(json_dumps(core_record))
     print("\n")
-    print(json.dumps(tabby_records))
+    print(json_dumps(tabby_records))
 
     # Add metadata to catalog if so specified
     if args.add_to_catalog:
@@ -1,12 +1,22 @@
 from argparse import ArgumentParser
 import csv
-import json
+import os
 from pathlib import Path
 
+from datalad.api import (
+    catalog_add,
+    catalog_set,
+)
 from datalad_next.constraints.dataset import EnsureDataset
 
 from get_tabby_metadata import get_tabby_metadata
-from process_homepage import get_super_metadata
+from process_homepage import (
+    CATALOG_DIR,
+    REPO_PATH,
+    SUPERDS_CONFIG,
+    get_super_metadata,
+    json_dumps,
+)
 
 
 if __name__ == "__main__":
@@ -40,7 +50,6 @@ if __name__ == "__main__":
     ds = EnsureDataset(
         installed=True, purpose="get subdirectory metadata", require_id=True
     )(args.dataset_path).ds
-    repo_path = Path(__file__).resolve().parent.parent
     
     # 1. Get tabby metadata from files at 'subdir_path'. This metadata
     #    describes a dataset that will be added as a subdataset to the
@@ -78,7 +87,7 @@ if __name__ == "__main__":
     # - First get the home page tabby record
     home_tabby_record = get_tabby_metadata(
         tabby_path=None,
-        dataset_path=repo_path / 'data',
+        dataset_path=REPO_PATH / 'data',
         id_source='datalad_dataset')
     # - Then get existing subdatasets from this home record
     home_dataset_record = [r for r in home_tabby_record if r["type"] == "dataset"]
@@ -110,29 +119,42 @@ if __name__ == "__main__":
                 writer.writeheader()
                 writer.writerow(subdataset)
         else:
-            # If there IS a tabby file, first read all rows
+            # If there IS a tabby file, first scan it for the same subdataset
+            # with a different version, without keeping the rows in memory
             with subdatasets_tabby_path.open("r") as csvfile_in:
-                all_rows = []
-                for row in csv.DictReader(csvfile_in, delimiter="\t"):
-                    all_rows.append(row)
-                # then check if the same subdataset with different version is already in the list
-                prior_subds_i = next((i for i, item in enumerate(all_rows)
+                reader = csv.DictReader(csvfile_in, delimiter="\t")
+                prior_subds_i = next((i for i, item in enumerate(reader)
                                     if item["identifier"] == subds_id
                                     and item["version"] != subds_version
                                     and item["path_posix"] == subds_path
                                     ), -1)
+                existing_fieldnames = reader.fieldnames
+            if prior_subds_i == -1 and existing_fieldnames == fieldnames:
+                with subdatasets_tabby_path.open("rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    ends_with_newline = f.read(1) == b"\n"
+            else:
+                ends_with_newline = False
+            if ends_with_newline:
+                # If not in the list (the common case), append the new
+                # subdataset without rewriting the file
+                with subdatasets_tabby_path.open("a", encoding="utf-8", newline="") as csvfile_out:
+                    writer = csv.DictWriter(csvfile_out, delimiter="\t", fieldnames=fieldnames)
+                    writer.writerow(subdataset)
+            else:
+                # Otherwise read all rows, replace the previous subdataset
+                # entry with the new version (or append it), and rewrite
+                with subdatasets_tabby_path.open("r") as csvfile_in:
+                    all_rows = list(csv.DictReader(csvfile_in, delimiter="\t"))
                 if prior_subds_i > -1:
-                    # If in the list, replace previous subdataset entry with new version
                     all_rows[prior_subds_i] = subdataset
                 else:
-                    # If not in the list, append the new subdataset
                     all_rows.append(subdataset)
-            # Then write the updated list to file
-            with subdatasets_tabby_path.open("w", encoding="utf-8", newline="") as csvfile_out:
-                writer = csv.DictWriter(csvfile_out, delimiter="\t", fieldnames=fieldnames)
-                writer.writeheader()
-                for r in all_rows:
-                    writer.writerow(r)
+                with subdatasets_tabby_path.open("w", encoding="utf-8", newline="") as csvfile_out:
+                    writer = csv.DictWriter(csvfile_out, delimiter="\t", fieldnames=fieldnames)
+                    writer.writeheader()
+                    for r in all_rows:
+                        writer.writerow(r)
     else:
         subdataset_added = False   
     # 4. Save the datalad superdataset:
@@ -143,6 +165,8 @@ if __name__ == "__main__":
             message=f"Adds new sub-directory ({args.subdir_path}) as a subdataset in tabby metadata",
             to_git=True,
         )
+        # the saved dataset has a new version and updated tabby sheets
+        get_tabby_metadata.cache_clear()
     # 5. Get (possibly updated) homepage metadata
     home_core_record, home_tabby_records = get_super_metadata(ds)
     
@@ -150,24 +174,19 @@ if __name__ == "__main__":
     # - if specified via 'add_to_catalog' argument
     # - depending on the --add-type argument (dataset / files / both)
     if args.add_to_catalog:
-        from datalad.api import  (
-            catalog_add,
-            catalog_set,
-        )
-        catalog_dir = repo_path / 'catalog'
         if not args.ignore_super:
             # Add superdataset core metadata to the catalog
             catalog_add(
-                catalog=catalog_dir,
-                metadata=json.dumps(home_core_record),
-                config_file = repo_path / 'inputs' / 'superds-config.json',
+                catalog=CATALOG_DIR,
+                metadata=json_dumps(home_core_record),
+                config_file = SUPERDS_CONFIG,
             )
             # Add superdataset tabby metadata to the catalog
             for r in home_tabby_records:
                 catalog_add(
-                    catalog=catalog_dir,
-                    metadata=json.dumps(r),
-                    config_file = repo_path / 'inputs' / 'superds-config.json',
+                    catalog=CATALOG_DIR,
+                    metadata=json_dumps(r),
+                    config_file = SUPERDS_CONFIG,
                 )
         # get correct config
         cfg_fname = 'subds-config.json'
@@ -180,15 +199,15 @@ if __name__ == "__main__":
             subds_records_to_add = [r for r in subds_tabby_records if r["type"] == args.add_type]
         for r in subds_records_to_add:
             catalog_add(
-                catalog=catalog_dir,
-                metadata=json.dumps(r),
-                config_file = repo_path / 'inputs' / cfg_fname,
+                catalog=CATALOG_DIR,
+                metadata=json_dumps(r),
+                config_file = REPO_PATH / 'inputs' / cfg_fname,
             )
 
         if not args.ignore_super:
             # 7. Set new catalog homepage
             catalog_set(
-                catalog=catalog_dir,
+                catalog=CATALOG_DIR,
                 property="home",
                 dataset_id=home_core_record["dataset_id"],
                 dataset_version=home_core_record["dataset_version"],
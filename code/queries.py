@@ -1,10 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from functools import lru_cache
 import json
+import os
 from urllib.parse import urlparse, urljoin, quote as urlquote
 import warnings
 
 from pyld import jsonld
+import requests
+from requests.adapters import HTTPAdapter
 import requests_cache
+from urllib3.util import Retry
+
+try:
+    # orjson parses considerably faster, but is optional
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
+
+# Shared by all lookups, so that the SQLite cache is opened once and
+# HTTP connections are kept alive between requests
+_SESSION = requests_cache.CachedSession(
+    "query_cache",
+    backend="sqlite",
+    allowable_methods=("GET",),
+    # expiration is set per host here rather than per request, which
+    # keeps cache hits on the fast path; other responses (OLS) never expire,
+    # unless the server's Cache-Control headers say otherwise
+    urls_expire_after={"api.crossref.org/*": timedelta(hours=1)},
+    # honor Cache-Control, and revalidate expired responses with their
+    # ETag / Last-Modified, so an unchanged response (304) is not resent
+    cache_control=True,
+    always_revalidate=False,
+    # during outages (connection errors or error status codes),
+    # fall back to a cached response that expired up to a week ago
+    stale_if_error=timedelta(days=7),
+    wal=True,
+    fast_save=True,
+)
+_SESSION.headers.update({
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "datacat (https://data.r2d2.de/)",
+})
+# Pooled keep-alive connections shared by the lookup threads; transient
+# server errors are retried, and the last response returned if they persist
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[500, 502, 503, 504],
+        raise_on_status=False,
+    ),
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+
+@lru_cache(maxsize=4096)
+def _get_json(url, session):
+    """Return the json content of a GET request, cached in memory
+
+    This is an in-process cache in front of the session's own (SQLite)
+    cache, so repeated requests within a run skip the cache lookup and
+    deserialization. The returned object is shared between calls and
+    must not be modified. Raises requests.HTTPError for responses other
+    than 200, which are thus not cached.
+
+    """
+    r = session.get(url)
+    if r.status_code != 200:
+        raise requests.HTTPError(f"{r.status_code} for {url}", response=r)
+    # parse the raw bytes, skipping the decode to text
+    return _loads(r.content)
 
 
 def get_doi_id(doi):
@@ -44,18 +115,54 @@ CAT_AUTHOR = {
 }
 
 
-def query_crossref(doi, session, email="m.szczepanik@fz-juelich.de"):
+def _context_iri(context, term):
+    """Resolve a term of a flat JSON-LD context to its full IRI"""
+    value = context[term]
+    prefix, sep, suffix = value.partition(":")
+    if sep and not suffix.startswith("//") and prefix in context:
+        return context[prefix] + suffix
+    return value
 
-    r = session.get(
-        url = f"https://api.crossref.org/works/{doi}?mailto={email}",
-        expire_after=timedelta(hours=1)
-    )
 
-    if r.status_code != 200:
-        return None
+# Both author contexts are static, so JSON-LD compaction of a Crossref
+# author into the catalog author context amounts to renaming the keys
+# that map to the same IRI; resolve that renaming once at import time
+_CAT_AUTHOR_TERMS = {iri: term for term, iri in CAT_AUTHOR.items()}
+CROSSREF_TO_CAT_AUTHOR = {
+    term: _CAT_AUTHOR_TERMS[_context_iri(CROSSREF_AUTHOR, term)]
+    for term in CROSSREF_AUTHOR
+    if _context_iri(CROSSREF_AUTHOR, term) in _CAT_AUTHOR_TERMS
+}
+
+
+# Crossref work fields read by query_crossref
+CROSSREF_FIELDS = "DOI,type,title,issued,container-title,author"
 
-    d = json.loads(r.text)
+
+def query_crossref(doi, session=_SESSION, email="m.szczepanik@fz-juelich.de"):
+
+    if "," in doi:
+        # commas separate filters, so use the single work route
+        url = f"https://api.crossref.org/works/{urlquote(doi, safe='/')}"
+        params = {"mailto": email}
+    else:
+        # only the work listing supports 'select', which leaves out the
+        # (often large) references and abstract we don't use
+        url = "https://api.crossref.org/works"
+        params = {"filter": f"doi:{doi}", "select": CROSSREF_FIELDS,
+                  "rows": 1, "mailto": email}
+    # encode the query (DOIs may contain e.g. '&', '+' or '#') into the
+    # final url, which also serves as the _get_json cache key
+    url = requests.Request("GET", url, params=params).prepare().url
+    try:
+        d = _get_json(url, session)
+    except requests.HTTPError:
+        return None
     msg = d['message']
+    if 'items' in msg:
+        if not msg['items']:
+            return None
+        msg = msg['items'][0]
 
     pub = {
         "type": msg.get('type'),  # prob. journal-article  # required
@@ -65,17 +172,27 @@ def query_crossref(doi, session, email="m.szczepanik@fz-juelich.de"):
         "publicationOutlet": msg.get('container-title', [None])[0] # not required
     }
 
+    # full JSON-LD compaction can be requested to cross-check the mapping
+    strict_jsonld = os.environ.get("DATACAT_STRICT_JSONLD")
     authors = []
     for a in msg.get('author'):
-        ca = jsonld.compact(a, ctx=CAT_AUTHOR, options={'expandContext': CROSSREF_AUTHOR})
-        # drop @context and keys not defined for catalog
-        author = {k:v for k,v in ca.items() if k in CAT_AUTHOR.keys()}
-        # fold in orcid (see load_tabby.process_author)
-        # see load_tabby:process_authors.py
-        if orcid := author.pop("orcid", False):
-            author["identifiers"] = [
-                {"name": "ORCID", "identifier": orcid},
-        ]
+        if strict_jsonld:
+            ca = jsonld.compact(a, ctx=CAT_AUTHOR, options={'expandContext': CROSSREF_AUTHOR})
+            # drop @context and keys not defined for catalog
+            items = ((k, v) for k, v in ca.items() if k in CAT_AUTHOR)
+        else:
+            # rename keys to catalog terms, dropping keys not defined for catalog
+            items = ((CROSSREF_TO_CAT_AUTHOR[k], v) for k, v in a.items()
+                     if k in CROSSREF_TO_CAT_AUTHOR and v is not None)
+        author = {}
+        for k, v in items:
+            if k != "orcid":
+                author[k] = v
+            elif v:
+                # fold in orcid as identifiers (see utils.process_authors)
+                author["identifiers"] = [
+                    {"name": "ORCID", "identifier": v},
+                ]
         # TODO: e-mail is required in the catalog shema dshgafhfadasfhdsgjfgasdjfgasdj!!!
         authors.append(author)
 
@@ -85,7 +202,27 @@ def query_crossref(doi, session, email="m.szczepanik@fz-juelich.de"):
 
 
 
-def ols_lookup(term, session, iri_prefix="http://purl.obolibrary.org/obo/"):
+OLS_API = "http://www.ebi.ac.uk/ols4/api/ontologies"
+OBO_IRI_PREFIX = "http://purl.obolibrary.org/obo/"
+# Maximum number of concurrent requests to the OLS API
+OLS_MAX_WORKERS = 8
+
+
+@lru_cache(maxsize=4096)
+def _ols_term_url(term, iri_prefix=OBO_IRI_PREFIX):
+    """Return the OLS API url of a term
+
+    The term IRI is url-encoded twice in the path, as required by the
+    OLS API. Cached, since the same terms (species, parcellations)
+    recur across datasets.
+
+    """
+    ontology = term.split(":")[0].lower()
+    iri = urlquote(urlquote(urljoin(iri_prefix, term.replace(":", "_")), safe=""))
+    return f"{OLS_API}/{ontology}/terms/{iri}"
+
+
+def ols_lookup(term, session, iri_prefix=OBO_IRI_PREFIX):
     """Look up a term in OLS API
 
     Takes a term like like UBERON:0013702. Assumes that the part
@@ -98,19 +235,65 @@ def ols_lookup(term, session, iri_prefix="http://purl.obolibrary.org/obo/"):
 
     """
 
-    api = "http://www.ebi.ac.uk/ols4/api/ontologies"
+    try:
+        return _get_json(_ols_term_url(term, iri_prefix), session)
+    except requests.HTTPError as e:
+        warnings.warn(f"OLS lookup for {term} returned {e.response.status_code}", stacklevel=2)
+        return None
 
-    ontology = term.split(":")[0].lower()
-    iri = urlquote(urlquote(urljoin(iri_prefix, term.replace(":", "_")), safe=""))
-    url = f"{api}/{ontology}/terms/{iri}"
 
-    r = session.get(url, headers={"Accept": "application/json"})
+def _ols_lookup_batch(ontology, terms, session, iri_prefix=OBO_IRI_PREFIX):
+    """Look up several terms of one ontology in a single OLS API query
 
+    Passes the IRIs of all terms as repeated "iri" parameters. Returns
+    a dict mapping each term that was found to its json response.
+
+    """
+    iris = {urljoin(iri_prefix, t.replace(":", "_")): t for t in terms}
+    params = [("iri", iri) for iri in iris] + [("size", len(iris))]
+    r = session.get(f"{OLS_API}/{ontology}/terms", params=params)
     if r.status_code != 200:
-        warnings.warn(f"OLS lookup for {term} returned {r.status_code}", stacklevel=2)
-        return None
+        return {}
+    found = {}
+    for res in _loads(r.content).get("_embedded", {}).get("terms", []):
+        if (t := iris.get(res.get("iri"))) is not None:
+            found[t] = res
+    return found
+
 
-    return r.json()
+def ols_lookup_many(terms, session, iri_prefix=OBO_IRI_PREFIX):
+    """Look up a list of terms in OLS API
+
+    Groups the terms by ontology (same convention as ols_lookup) and
+    queries each ontology once for all of its terms. Terms missing
+    from a batch response (e.g. if the server ignores repeated
+    parameters) are looked up one by one with ols_lookup. Requests are
+    independent, so they are sent concurrently from a small thread
+    pool (capped to respect OLS rate limits).
+
+    Returns a list of json responses (or None), in the order of terms.
+
+    """
+    unique_terms = list(dict.fromkeys(terms))
+    by_ontology = {}
+    for t in unique_terms:
+        by_ontology.setdefault(t.split(":")[0].lower(), []).append(t)
+    batches = {o: g for o, g in by_ontology.items() if len(g) > 1}
+
+    found = {}
+    with ThreadPoolExecutor(max_workers=OLS_MAX_WORKERS) as executor:
+        for res in executor.map(
+            lambda o: _ols_lookup_batch(o, batches[o], session, iri_prefix),
+            batches,
+        ):
+            found.update(res)
+        missing = [t for t in unique_terms if t not in found]
+        found.update(zip(missing, executor.map(
+            lambda t: ols_lookup(t, session, iri_prefix),
+            missing,
+        )))
+
+    return [found[t] for t in terms]
 
 
 def repr_ncbitaxon(ols_response, default=None):
@@ -162,19 +345,18 @@ def repr_uberon(ols_response, default=None):
     return UBERONParcellation
 
 
-def process_ols_term(term, filter_func, session_name="query_cache"):
+def process_ols_term(term, filter_func, session=_SESSION):
     """Query OLS api and return nice representations
 
     Runs an OLS API query for the given term and applies filter_func
     to its result. Accepts single term, list of terms, or None, and
-    returns the same type. Uses requests_cache session to cache
-    responses.
+    returns the same type. Uses the module-level requests_cache
+    session to cache responses, unless another session is given.
 
     """
-    session = requests_cache.CachedSession(session_name)
 
     if isinstance(term, list):
-        return [filter_func(ols_lookup(t, session), t) for t in term]
+        return [filter_func(r, t) for r, t in zip(ols_lookup_many(term, session), term)]
     elif isinstance(term, str):
         return filter_func(ols_lookup(term, session), term)
     else:
@@ -1,16 +1,33 @@
+from functools import lru_cache, wraps
 import uuid
 from urllib.parse import urlparse
 
 
+# namespace for deterministic dataset ids, constant so computed once
+_DATALAD_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "datalad.org")
+
+
 def mint_dataset_id(ds_name):
     """Create a deterministic id based on a custom convention
 
     Uses "abcd-j.{ds_name}" as an input for UUID
     generation. Lowercases project. If there are multiple projects,
-    uses the first one given.
+    uses the first one given. Results for string names are cached,
+    since the same dataset name is often resolved repeatedly.
 
     """
+    if isinstance(ds_name, str):
+        return _mint_dataset_id_cached(ds_name)
+    # e.g. a list of names, which cannot be a cache key
+    return _mint_dataset_id(ds_name)
+
+
+@lru_cache(maxsize=8192)
+def _mint_dataset_id_cached(ds_name):
+    return _mint_dataset_id(ds_name)
 
+
+def _mint_dataset_id(ds_name):
     dsid_input = {
         "name": ds_name,
     }
@@ -27,24 +44,21 @@ def get_dataset_id(input, config):
     # instantiate raw ID string
     raw_id = fmt.format(**input)
     # now turn into UUID deterministically
-    return str(
-        uuid.uuid5(
-            uuid.uuid5(uuid.NAMESPACE_DNS, "datalad.org"),
-            raw_id,
-        )
-    )
+    return str(uuid.uuid5(_DATALAD_NAMESPACE, raw_id))
+
+# author keys defined in the catalog schema
+_KNOWN_AUTHOR_KEYS = frozenset({
+    "name",
+    "email",
+    "identifiers",
+    "givenName",
+    "familyName",
+    "honorificSuffix",
+})
+
 
 def process_authors(authors):
     """Convert author(s) to a list of catalog-schema authors"""
-    known_keys = [
-        "name",
-        "email",
-        "identifiers",
-        "givenName",
-        "familyName",
-        "honorificSuffix",
-    ]
-
     if authors is None:
         return None
     if isinstance(authors, dict):
@@ -52,10 +66,18 @@ def process_authors(authors):
 
     result = []
     for author in authors:
-        # drop not-known keys (like @type)
-        d = {k: v for k, v in author.items() if k in known_keys and v is not None}
+        # drop not-known keys (like @type), picking up orcid on the way
+        d = {}
+        orcid = None
+        for k, v in author.items():
+            if v is None:
+                continue
+            if k in _KNOWN_AUTHOR_KEYS:
+                d[k] = v
+            elif k == "orcid":
+                orcid = v
         # re-insert orcid as identifiers
-        if orcid := author.get("orcid", False):
+        if orcid:
             d["identifiers"] = [
                 {"name": "ORCID", "identifier": orcid},
             ]
@@ -106,14 +128,16 @@ def process_publications(publications):
 
     res = []
     for publication in publications:
-        citation = publication.pop("citation", None)
+        # build a new dict rather than modifying the input
+        citation = publication.get("citation")
+        pub = {k: v for k, v in publication.items() if k != "citation"}
 
         if citation is not None:
-            publication["title"] = citation
-            publication["authors"] = []
+            pub["title"] = citation
+            pub["authors"] = []
 
         # todo: doi lookup
-        res.append(publication)
+        res.append(pub)
 
     return res
 
@@ -148,6 +172,26 @@ def process_arc(data_controller):
     return {"givenName": first, "familyName": last, "email": email}
 
 
+def listwise(fn):
+    """Apply a single-item conversion to None, a single item, or a list
+
+    Returns None for None, a list for a list (or tuple), with each
+    element handled the same way (so nested lists and None elements
+    are kept), and the converted item otherwise.
+
+    """
+    @wraps(fn)
+    def wrapper(x):
+        if x is None:
+            return None
+        if isinstance(x, (list, tuple)):
+            return [wrapper(i) for i in x]
+        return fn(x)
+
+    return wrapper
+
+
+@listwise
 def process_data_controller(data_controller):
     """Convert data controller to a dict or list of dict
 
@@ -155,14 +199,10 @@ def process_data_controller(data_controller):
     controllers to be persons) for linked data scenarios.
 
     """
-    if data_controller is None:
-        return None
-    if isinstance(data_controller, list):
-        return [process_data_controller(dc) for dc in data_controller]
-
     return {"@type": "https://schema.org/Person"} | data_controller
 
 
+@listwise
 def process_used_for(activity):
     """Change an activity-dict to a schema.org Thing
 
@@ -171,11 +211,6 @@ def process_used_for(activity):
     properties and allow the catalog to display them nicely.
 
     """
-    if isinstance(activity, list):
-        return [process_used_for(act) for act in activity]
-    if activity is None:
-        return None
-
     thing = {"@type": "https://schema.org/Thing"}
     thing["name"] = activity.get("title", "")
 
@@ -202,24 +237,28 @@ def process_file(f):
     tabby (does not contain type and dataset id/version).
 
     """
-    d = {
-        "path": f.get("path", {}).get("@value"),
-        "contentbytesize": f.get("contentbytesize", {}).get("@value"),
-        "url": f.get("url"),
-    }
-
-    if f.get("path") is None and f.get("name") is not None:
+    d = {}
+    path = f.get("path")
+    if path is None:
         # scoped context definition doesn't work for me as intended,
         # no idea why -- this would cover all bases
-        d["path"] = f.get("name", {}).get("@value")
-
-    if d.get("contentbytesize", False):
+        path = f.get("name")
+    if path is not None and (value := path.get("@value")) is not None:
+        d["path"] = value
+    if (size := f.get("contentbytesize", {}).get("@value")) is not None:
         # type conversion
-        d["contentbytesize"] = int(d["contentbytesize"])
+        d["contentbytesize"] = int(size) if size else size
+    if (url := f.get("url")) is not None:
+        d["url"] = url
+    return d
 
-    return {k: v for k, v in d.items() if v is not None}
 
+def process_files(files):
+    """Convert a list of file information to catalog schema"""
+    return [process_file(f) for f in files]
 
+
+@listwise
 def process_homepage(homepage):
     """Return homepage as a dict or list of dict
 
@@ -227,12 +266,7 @@ def process_homepage(homepage):
     linked data scenarios.
 
     """
-    if homepage is None:
-        return None
-    elif isinstance(homepage, list):
-        return [process_homepage(hp) for hp in homepage]
-    else:
-        return {"@type": "https://schema.org/URL", "@value": homepage}
+    return {"@type": "https://schema.org/URL", "@value": homepage}
     
 
 def process_subdatasets(subdatasets):
@@ -241,20 +275,14 @@ def process_subdatasets(subdatasets):
     """
     if subdatasets is None:
         return []
-    if isinstance(subdatasets, list):
-        return [dict(
-            dataset_id=subds.get("identifier"),
-            dataset_version=subds.get("version"),
-            dataset_path=subds.get("path_posix"),
-            dataset_url=subds.get("url"),
-        ) for subds in subdatasets]
     if isinstance(subdatasets, dict):
-        return [dict(
-            dataset_id=subdatasets.get("identifier"),
-            dataset_version=subdatasets.get("version"),
-            dataset_path=subdatasets.get("path_posix"),
-            dataset_url=subdatasets.get("url"),
-        )]
+        subdatasets = (subdatasets,)
+    return [dict(
+        dataset_id=subds.get("identifier"),
+        dataset_version=subds.get("version"),
+        dataset_path=subds.get("path_posix"),
+        dataset_url=subds.get("url"),
+    ) for subds in subdatasets]
 
 
 CAT_CONTEXT = {
@@ -321,4 +349,5 @@ CAT_CONTEXT = {
     },
     "sampleOrganism": "openminds:Species",
     "samplePart": "openminds:UBERONParcellation",
-}
\ No newline at end of file
+}
+